@@ -1,17 +1,23 @@
-from fastapi import FastAPI, APIRouter, File, UploadFile, HTTPException, Form
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, APIRouter, File, UploadFile, HTTPException, Form, Query
+from fastapi.responses import FileResponse, ORJSONResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import AsyncMongoClient, InsertOne, ReturnDocument, UpdateMany, UpdateOne
 import os
+import asyncio
 import logging
+import time
 from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import uuid
+import hashlib
+from urllib.parse import quote
 from datetime import datetime, timedelta
 import shutil
 import json
+import aiofiles
+import orjson
 from enum import Enum
 
 ROOT_DIR = Path(__file__).parent
@@ -20,14 +26,32 @@ load_dotenv(ROOT_DIR / '.env')
 # Create uploads directory
 UPLOAD_DIR = ROOT_DIR / "uploads"
 UPLOAD_DIR.mkdir(exist_ok=True)
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+MAX_UPLOAD_SIZE = 2 * 1024 * 1024 * 1024  # 2GB
+ALLOWED_VIDEO_EXTENSIONS = frozenset({'.mp4', '.mov', '.avi'})
+VIDEO_MEDIA_TYPES = {'.mp4': 'video/mp4', '.mov': 'video/quicktime', '.avi': 'video/x-msvideo'}
+
+# When set (e.g. "/protected-uploads/"), video files are handed off to nginx via X-Accel-Redirect
+UPLOADS_ACCEL_PREFIX = os.environ.get('UPLOADS_ACCEL_PREFIX')
+
+# Pagination limits for list endpoints
+MAX_PAGE_SIZE = 1000
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncMongoClient(
+    mongo_url,
+    maxPoolSize=50,
+    minPoolSize=10,
+    compressors="zstd,zlib",
+    serverSelectionTimeoutMS=3000,
+    waitQueueTimeoutMS=2000,
+    retryWrites=True
+)
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
-app = FastAPI(title="YouTube Shorts Automation Server")
+app = FastAPI(title="YouTube Shorts Automation Server", default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -55,6 +79,7 @@ class VideoUpload(BaseModel):
     status: VideoStatus = VideoStatus.UPLOADED
     metadata_id: Optional[str] = None
     sequence_number: Optional[int] = None
+    content_hash: Optional[str] = None
 
 class VideoMetadata(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -112,18 +137,94 @@ class DashboardStats(BaseModel):
     pending: int
     unused_metadata: int
 
+# Projections matching the response models, so Mongo only sends the fields we return
+VIDEO_PROJECTION = {"_id": 0, **{field: 1 for field in VideoUpload.model_fields}}
+METADATA_PROJECTION = {"_id": 0, **{field: 1 for field in VideoMetadata.model_fields}}
+QUEUE_PROJECTION = {"_id": 0, **{field: 1 for field in UploadQueue.model_fields}}
+API_CONFIG_PROJECTION = {"_id": 0, **{field: 1 for field in APIConfiguration.model_fields}}
+
 # Helper functions
+_INTERVAL_DELTAS = {
+    ScheduleInterval.IMMEDIATELY: timedelta(0),
+    ScheduleInterval.THIRTY_MIN: timedelta(minutes=30),
+    ScheduleInterval.ONE_HOUR: timedelta(hours=1),
+    ScheduleInterval.THREE_HOUR: timedelta(hours=3),
+}
+
 def calculate_scheduled_time(interval: ScheduleInterval) -> datetime:
-    now = datetime.utcnow()
-    if interval == ScheduleInterval.IMMEDIATELY:
-        return now
-    elif interval == ScheduleInterval.THIRTY_MIN:
-        return now + timedelta(minutes=30)
-    elif interval == ScheduleInterval.ONE_HOUR:
-        return now + timedelta(hours=1)
-    elif interval == ScheduleInterval.THREE_HOUR:
-        return now + timedelta(hours=3)
-    return now
+    return datetime.utcnow() + _INTERVAL_DELTAS.get(interval, timedelta(0))
+
+def content_disposition(filename: str) -> str:
+    """Build an attachment Content-Disposition header, RFC 5987-encoding non-ASCII names."""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+async def next_sequence_number(name: str, count: int = 1) -> int:
+    """Atomically reserve `count` sequence numbers and return the first one."""
+    counter = await db.counters.find_one_and_update(
+        {"_id": name},
+        {"$inc": {"seq": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["seq"] - count + 1
+
+async def release_metadata_claims(batch_id: str):
+    """Mark metadata claimed by a sequential scheduling batch as unused again."""
+    await db.metadata.update_many(
+        {"claim_batch_id": batch_id},
+        {"$set": {"is_used": False}, "$unset": {"claim_batch_id": ""}}
+    )
+
+async def stream_json_list(cursor) -> StreamingResponse:
+    """Stream a cursor as a JSON array, encoding one document at a time."""
+    # Run the query before the 200 goes out, so connection and query errors still become
+    # a normal error response instead of a truncated body
+    try:
+        first = await anext(cursor, None)
+    except BaseException:
+        await cursor.close()
+        raise
+    
+    async def generate():
+        try:
+            yield b"["
+            if first is not None:
+                yield orjson.dumps(first)
+                async for doc in cursor:
+                    yield b","
+                    yield orjson.dumps(doc)
+            yield b"]"
+        finally:
+            # Also runs when the client disconnects mid-stream
+            await cursor.close()
+    
+    return StreamingResponse(generate(), media_type="application/json")
+
+# Dashboard stats are polled frequently, so keep the last result for a few seconds
+DASHBOARD_STATS_TTL = 5  # seconds
+_dashboard_stats_cache = {"value": None, "expires": 0.0, "generation": 0, "refresh": None}
+
+def invalidate_dashboard_stats():
+    # Bumping the generation also stops an in-flight refresh from storing pre-write counts,
+    # and dropping the refresh makes the next poll start a new one instead of joining it
+    _dashboard_stats_cache["value"] = None
+    _dashboard_stats_cache["generation"] += 1
+    _dashboard_stats_cache["refresh"] = None
+
+async def _refresh_dashboard_stats() -> DashboardStats:
+    generation = _dashboard_stats_cache["generation"]
+    try:
+        stats = await _compute_dashboard_stats()
+        if _dashboard_stats_cache["generation"] == generation:
+            _dashboard_stats_cache["value"] = stats
+            _dashboard_stats_cache["expires"] = time.monotonic() + DASHBOARD_STATS_TTL
+        return stats
+    finally:
+        if _dashboard_stats_cache["refresh"] is asyncio.current_task():
+            _dashboard_stats_cache["refresh"] = None
 
 # API Routes
 
@@ -134,15 +235,34 @@ async def root():
 # Dashboard Stats
 @api_router.get("/dashboard/stats", response_model=DashboardStats)
 async def get_dashboard_stats():
-    total_videos = await db.videos.count_documents({})
-    completed = await db.upload_queue.count_documents({"status": VideoStatus.COMPLETED})
-    pending = await db.upload_queue.count_documents({"status": VideoStatus.PENDING})
-    unused_metadata = await db.metadata.count_documents({"is_used": False})
+    if _dashboard_stats_cache["value"] is not None and time.monotonic() < _dashboard_stats_cache["expires"]:
+        return _dashboard_stats_cache["value"]
+    
+    # Concurrent pollers share one in-flight refresh, so a slow database costs one round-trip
+    # (or one timeout) for all of them rather than one each in turn
+    if _dashboard_stats_cache["refresh"] is None:
+        _dashboard_stats_cache["refresh"] = asyncio.create_task(_refresh_dashboard_stats())
+    # Shielded so one poller disconnecting doesn't cancel the refresh for the others
+    return await asyncio.shield(_dashboard_stats_cache["refresh"])
+
+async def _compute_dashboard_stats() -> DashboardStats:
+    # Count queue items per status in one pass and run the independent counts concurrently
+    queue_pipeline = [
+        {"$match": {"status": {"$in": [VideoStatus.COMPLETED, VideoStatus.PENDING]}}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ]
+    total_videos, queue_cursor, unused_metadata = await asyncio.gather(
+        db.videos.count_documents({}),
+        db.upload_queue.aggregate(queue_pipeline),
+        db.metadata.count_documents({"is_used": False})
+    )
+    queue_counts = await queue_cursor.to_list(None)
+    status_counts = {item["_id"]: item["count"] for item in queue_counts}
     
     return DashboardStats(
         total_videos=total_videos,
-        completed=completed,
-        pending=pending,
+        completed=status_counts.get(VideoStatus.COMPLETED, 0),
+        pending=status_counts.get(VideoStatus.PENDING, 0),
         unused_metadata=unused_metadata
     )
 
@@ -153,93 +273,147 @@ async def upload_video(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="No file selected")
     
     # Check file extension
-    allowed_extensions = ['.mp4', '.mov', '.avi']
     file_ext = Path(file.filename).suffix.lower()
-    if file_ext not in allowed_extensions:
+    if file_ext not in ALLOWED_VIDEO_EXTENSIONS:
         raise HTTPException(status_code=400, detail="Only MP4, MOV, AVI files allowed")
     
-    # Check file size (2GB limit)
-    file_size = 0
-    file_content = await file.read()
-    file_size = len(file_content)
-    if file_size > 2 * 1024 * 1024 * 1024:  # 2GB
-        raise HTTPException(status_code=400, detail="File size exceeds 2GB limit")
-    
-    # Get next sequence number
-    video_count = await db.videos.count_documents({})
-    sequence_number = video_count + 1
+    # Reject oversized uploads before copying them when the size is already known
+    if file.size is not None and file.size > MAX_UPLOAD_SIZE:
+        await file.close()
+        raise HTTPException(status_code=413, detail="File size exceeds 2GB limit")
     
-    # Save file
+    # Save file in chunks, enforcing the size limit as we go
     file_id = str(uuid.uuid4())
     file_path = UPLOAD_DIR / f"{file_id}_{file.filename}"
+    tmp_path = UPLOAD_DIR / f"{file_id}.part"
+    
+    file_size = 0
+    hasher = hashlib.blake2b(digest_size=32)
+    try:
+        async with aiofiles.open(tmp_path, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                file_size += len(chunk)
+                if file_size > MAX_UPLOAD_SIZE:
+                    break
+                hasher.update(chunk)
+                await buffer.write(chunk)
+        
+        if file_size > MAX_UPLOAD_SIZE:
+            await file.close()
+            raise HTTPException(status_code=413, detail="File size exceeds 2GB limit")
+        
+        # Reuse the stored file if identical content was uploaded before
+        content_hash = hasher.hexdigest()
+        existing = await db.videos.find_one({"content_hash": content_hash}, {"_id": 0, "file_path": 1})
+        if existing:
+            await asyncio.to_thread(os.unlink, tmp_path)
+            file_path = existing["file_path"]
+        else:
+            await asyncio.to_thread(os.rename, tmp_path, file_path)
+    except BaseException:
+        # Never leave a partial upload behind (oversize, disk full, client disconnect, DB error)
+        await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+        raise
     
-    with open(file_path, "wb") as buffer:
-        buffer.write(file_content)
+    # Get next sequence number
+    sequence_number = await next_sequence_number("videos")
     
     # Save to database
     video_data = VideoUpload(
         filename=file.filename,
         file_path=str(file_path),
         file_size=file_size,
-        sequence_number=sequence_number
+        sequence_number=sequence_number,
+        content_hash=content_hash
     )
     
     await db.videos.insert_one(video_data.dict())
+    invalidate_dashboard_stats()
     return {"message": "Video uploaded successfully", "video_id": video_data.id, "sequence_number": sequence_number}
 
 # Get all videos
-@api_router.get("/videos", response_model=List[VideoUpload])
-async def get_videos():
-    videos = await db.videos.find().to_list(1000)
-    return [VideoUpload(**video) for video in videos]
+@api_router.get("/videos", responses={200: {"model": List[VideoUpload]}})
+async def get_videos(skip: int = Query(0, ge=0), limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    cursor = db.videos.find({}, VIDEO_PROJECTION).sort([("sequence_number", 1), ("_id", 1)]).skip(skip).limit(limit)
+    return await stream_json_list(cursor)
+
+# Serve a stored video file
+@api_router.get("/videos/{video_id}/file")
+async def get_video_file(video_id: str):
+    video = await db.videos.find_one({"id": video_id}, {"_id": 0, "filename": 1, "file_path": 1})
+    if not video:
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    file_path = Path(video["file_path"])
+    media_type = VIDEO_MEDIA_TYPES.get(Path(video["filename"]).suffix.lower(), "application/octet-stream")
+    # Download under the uploaded name, not the uuid-prefixed name on disk
+    headers = {"Content-Disposition": content_disposition(video["filename"])}
+    
+    if UPLOADS_ACCEL_PREFIX:
+        # Let the fronting nginx send the file so the bytes never pass through Python
+        headers["X-Accel-Redirect"] = f"{UPLOADS_ACCEL_PREFIX.rstrip('/')}/{quote(file_path.name)}"
+        return Response(media_type=media_type, headers=headers)
+    
+    if not file_path.is_file():
+        raise HTTPException(status_code=404, detail="Video file not found")
+    return FileResponse(file_path, media_type=media_type, headers=headers)
 
 # Metadata Management
 @api_router.post("/metadata", response_model=VideoMetadata)
 async def create_metadata(metadata: VideoMetadataCreate):
     # Get next sequence number
-    metadata_count = await db.metadata.count_documents({})
-    sequence_number = metadata_count + 1
+    sequence_number = await next_sequence_number("metadata")
     
     metadata_obj = VideoMetadata(**metadata.dict(), sequence_number=sequence_number)
     await db.metadata.insert_one(metadata_obj.dict())
+    invalidate_dashboard_stats()
     return metadata_obj
 
 @api_router.post("/metadata/bulk")
 async def bulk_create_metadata(metadata_list: List[VideoMetadataCreate]):
-    # Get starting sequence number
-    metadata_count = await db.metadata.count_documents({})
+    # Reserve a block of sequence numbers for the whole batch
+    first_sequence = await next_sequence_number("metadata", len(metadata_list))
     
     metadata_objects = []
     for i, metadata in enumerate(metadata_list):
-        sequence_number = metadata_count + i + 1
+        sequence_number = first_sequence + i
         metadata_obj = VideoMetadata(**metadata.dict(), sequence_number=sequence_number)
         metadata_objects.append(metadata_obj)
     
     metadata_dicts = [metadata.dict() for metadata in metadata_objects]
     await db.metadata.insert_many(metadata_dicts)
+    invalidate_dashboard_stats()
     return {"message": f"Created {len(metadata_objects)} metadata entries"}
 
-@api_router.get("/metadata", response_model=List[VideoMetadata])
-async def get_metadata():
-    metadata = await db.metadata.find().to_list(1000)
-    return [VideoMetadata(**meta) for meta in metadata]
+@api_router.get("/metadata", responses={200: {"model": List[VideoMetadata]}})
+async def get_metadata(skip: int = Query(0, ge=0), limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    cursor = db.metadata.find({}, METADATA_PROJECTION).sort([("sequence_number", 1), ("_id", 1)]).skip(skip).limit(limit)
+    return await stream_json_list(cursor)
 
-@api_router.get("/metadata/unused", response_model=List[VideoMetadata])
-async def get_unused_metadata():
-    metadata = await db.metadata.find({"is_used": False}).to_list(1000)
-    return [VideoMetadata(**meta) for meta in metadata]
+@api_router.get("/metadata/unused", responses={200: {"model": List[VideoMetadata]}})
+async def get_unused_metadata(skip: int = Query(0, ge=0), limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    cursor = db.metadata.find({"is_used": False}, METADATA_PROJECTION).sort([("sequence_number", 1), ("_id", 1)]).skip(skip).limit(limit)
+    return await stream_json_list(cursor)
 
 # Upload Queue Management
 @api_router.post("/queue", response_model=UploadQueue)
 async def create_upload_queue(queue_item: UploadQueueCreate):
-    # Check if video and metadata exist
-    video = await db.videos.find_one({"id": queue_item.video_id})
-    metadata = await db.metadata.find_one({"id": queue_item.metadata_id})
-    
+    # Check the video first so a bad request never holds a claim on the metadata,
+    # then atomically claim the metadata if it is still unused
+    video = await db.videos.find_one({"id": queue_item.video_id}, {"_id": 1})
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
-    if not metadata:
-        raise HTTPException(status_code=404, detail="Metadata not found")
+    
+    claimed = await db.metadata.find_one_and_update(
+        {"id": queue_item.metadata_id, "is_used": False},
+        {"$set": {"is_used": True}},
+        projection={"_id": 1}
+    )
+    if not claimed:
+        metadata = await db.metadata.find_one({"id": queue_item.metadata_id}, {"_id": 1})
+        if not metadata:
+            raise HTTPException(status_code=404, detail="Metadata not found")
+        raise HTTPException(status_code=409, detail="Metadata is already used")
     
     scheduled_time = calculate_scheduled_time(queue_item.schedule_interval)
     
@@ -250,32 +424,34 @@ async def create_upload_queue(queue_item: UploadQueueCreate):
         scheduled_time=scheduled_time
     )
     
-    await db.upload_queue.insert_one(queue_obj.dict())
-    
-    # Mark metadata as used
-    await db.metadata.update_one(
-        {"id": queue_item.metadata_id},
-        {"$set": {"is_used": True}}
-    )
+    try:
+        await db.upload_queue.insert_one(queue_obj.dict())
+    except BaseException:
+        # Don't leave metadata marked as used without a queue item
+        await db.metadata.update_one({"_id": claimed["_id"]}, {"$set": {"is_used": False}})
+        raise
+    invalidate_dashboard_stats()
     
     return queue_obj
 
-@api_router.get("/queue", response_model=List[UploadQueue])
-async def get_upload_queue():
-    queue_items = await db.upload_queue.find().sort("scheduled_time", 1).to_list(1000)
-    return [UploadQueue(**item) for item in queue_items]
+@api_router.get("/queue", responses={200: {"model": List[UploadQueue]}})
+async def get_upload_queue(skip: int = Query(0, ge=0), limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    cursor = db.upload_queue.find({}, QUEUE_PROJECTION).sort([("scheduled_time", 1), ("_id", 1)]).skip(skip).limit(limit)
+    return await stream_json_list(cursor)
 
-@api_router.get("/queue/pending", response_model=List[UploadQueue])
-async def get_pending_uploads():
-    queue_items = await db.upload_queue.find({"status": VideoStatus.PENDING}).sort("scheduled_time", 1).to_list(1000)
-    return [UploadQueue(**item) for item in queue_items]
+@api_router.get("/queue/pending", responses={200: {"model": List[UploadQueue]}})
+async def get_pending_uploads(skip: int = Query(0, ge=0), limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    cursor = db.upload_queue.find({"status": VideoStatus.PENDING}, QUEUE_PROJECTION).sort([("scheduled_time", 1), ("_id", 1)]).skip(skip).limit(limit)
+    return await stream_json_list(cursor)
 
 # Sequential Scheduling
 @api_router.post("/queue/sequential")
 async def create_sequential_upload_queue(schedule_data: SequentialScheduleCreate):
     # Get videos and metadata in sequence order
-    videos = await db.videos.find().sort("sequence_number", 1).to_list(1000)
-    metadata_list = await db.metadata.find({"is_used": False}).sort("sequence_number", 1).to_list(1000)
+    videos, metadata_list = await asyncio.gather(
+        db.videos.find({}, {"_id": 0, "id": 1}).sort([("sequence_number", 1), ("_id", 1)]).to_list(1000),
+        db.metadata.find({"is_used": False}, {"_id": 0, "id": 1}).sort([("sequence_number", 1), ("_id", 1)]).to_list(1000)
+    )
     
     if not videos:
         raise HTTPException(status_code=404, detail="No videos found")
@@ -297,22 +473,17 @@ async def create_sequential_upload_queue(schedule_data: SequentialScheduleCreate
     
     # Calculate time intervals
     base_time = datetime.utcnow()
-    interval_minutes = {
-        "immediately": 0,
-        "30m": 30,
-        "1h": 60,
-        "3h": 180
-    }.get(schedule_data.schedule_interval, 0)
+    interval_delta = _INTERVAL_DELTAS.get(schedule_data.schedule_interval, timedelta(0))
     
     for i in range(start_idx, end_idx):
         video = videos[i]
         metadata = metadata_list[i]
         
         # Calculate scheduled time with incremental delays
-        if schedule_data.schedule_interval == "immediately":
+        if schedule_data.schedule_interval == ScheduleInterval.IMMEDIATELY:
             scheduled_time = base_time + timedelta(minutes=i * 2)  # 2 min apart for immediate
         else:
-            scheduled_time = base_time + timedelta(minutes=interval_minutes + (i * interval_minutes))
+            scheduled_time = base_time + interval_delta * (i + 1)
         
         queue_obj = UploadQueue(
             video_id=video["id"],
@@ -321,15 +492,32 @@ async def create_sequential_upload_queue(schedule_data: SequentialScheduleCreate
             scheduled_time=scheduled_time
         )
         
-        await db.upload_queue.insert_one(queue_obj.dict())
-        
-        # Mark metadata as used
-        await db.metadata.update_one(
-            {"id": metadata["id"]},
-            {"$set": {"is_used": True}}
+        created_items.append(queue_obj)
+    
+    # Claim the whole batch of metadata at once, then write the queue items
+    if created_items:
+        batch_id = str(uuid.uuid4())
+        result = await db.metadata.update_many(
+            {"id": {"$in": [item.metadata_id for item in created_items]}, "is_used": False},
+            {"$set": {"is_used": True, "claim_batch_id": batch_id}}
         )
+        if result.modified_count != len(created_items):
+            # Another request claimed some of this metadata first; release ours
+            await release_metadata_claims(batch_id)
+            raise HTTPException(status_code=409, detail="Metadata was claimed by another request, please retry")
         
-        created_items.append(queue_obj)
+        try:
+            await db.upload_queue.insert_many([item.dict() for item in created_items])
+        except BaseException:
+            # Drop any items that did get inserted and give the metadata back
+            await db.upload_queue.delete_many({"id": {"$in": [item.id for item in created_items]}})
+            await release_metadata_claims(batch_id)
+            raise
+        
+        # The batch marker is only needed while the claim is in flight
+        await db.metadata.update_many({"claim_batch_id": batch_id}, {"$unset": {"claim_batch_id": ""}})
+    
+    invalidate_dashboard_stats()
     
     return {
         "message": f"Created {len(created_items)} sequential upload queue items",
@@ -341,38 +529,38 @@ async def create_sequential_upload_queue(schedule_data: SequentialScheduleCreate
 # API Configuration Management
 @api_router.post("/config/api", response_model=APIConfiguration)
 async def create_api_config(config: APIConfigurationCreate):
-    # Deactivate previous configs
-    await db.api_config.update_many({}, {"$set": {"is_active": False}})
-    
     config_obj = APIConfiguration(**config.dict())
-    await db.api_config.insert_one(config_obj.dict())
+    
+    # Insert the new active config, then deactivate the rest, in a single ordered batch.
+    # Activating first means there is never a moment with no active config.
+    await db.api_config.bulk_write([
+        InsertOne(config_obj.dict()),
+        UpdateMany({"id": {"$ne": config_obj.id}}, {"$set": {"is_active": False}})
+    ])
     return config_obj
 
 @api_router.get("/config/api", response_model=APIConfiguration)
 async def get_active_api_config():
-    config = await db.api_config.find_one({"is_active": True})
+    config = await db.api_config.find_one({"is_active": True}, API_CONFIG_PROJECTION)
     if not config:
         raise HTTPException(status_code=404, detail="No active API configuration found")
     return APIConfiguration(**config)
 
 @api_router.put("/config/api/{config_id}", response_model=APIConfiguration)
 async def update_api_config(config_id: str, config: APIConfigurationCreate):
-    # Deactivate all configs first
-    await db.api_config.update_many({}, {"$set": {"is_active": False}})
-    
-    # Update the specific config
     update_data = config.dict()
     update_data["is_active"] = True
     
-    result = await db.api_config.update_one(
-        {"id": config_id},
-        {"$set": update_data}
-    )
+    # Activate the specific config, then deactivate the rest, in a single ordered batch.
+    # Activating first means there is never a moment with no active config.
+    await db.api_config.bulk_write([
+        UpdateOne({"id": config_id}, {"$set": update_data}),
+        UpdateMany({"id": {"$ne": config_id}}, {"$set": {"is_active": False}})
+    ])
     
-    if result.matched_count == 0:
+    updated_config = await db.api_config.find_one({"id": config_id}, API_CONFIG_PROJECTION)
+    if not updated_config:
         raise HTTPException(status_code=404, detail="Configuration not found")
-    
-    updated_config = await db.api_config.find_one({"id": config_id})
     return APIConfiguration(**updated_config)
 
 @api_router.delete("/config/api/{config_id}")
@@ -400,6 +588,37 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    await asyncio.gather(
+        db.videos.create_index("id", unique=True),
+        db.videos.create_index([("sequence_number", 1), ("_id", 1)]),
+        db.videos.create_index("content_hash"),
+        db.metadata.create_index("id", unique=True),
+        db.metadata.create_index([("sequence_number", 1), ("_id", 1)]),
+        db.metadata.create_index([("is_used", 1), ("sequence_number", 1), ("_id", 1)]),
+        db.upload_queue.create_index([("status", 1), ("scheduled_time", 1), ("_id", 1)]),
+        db.upload_queue.create_index([("scheduled_time", 1), ("_id", 1)]),
+        db.api_config.create_index("id", unique=True),
+        db.api_config.create_index("is_active")
+    )
+
+@app.on_event("startup")
+async def init_sequence_counters():
+    # Make sure counters never hand out a sequence number that is already taken
+    for name, collection in (("videos", db.videos), ("metadata", db.metadata)):
+        last = await collection.find_one(
+            {"sequence_number": {"$ne": None}},
+            {"sequence_number": 1},
+            sort=[("sequence_number", -1)]
+        )
+        if last:
+            await db.counters.update_one(
+                {"_id": name},
+                {"$max": {"seq": last["sequence_number"]}},
+                upsert=True
+            )
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    await client.close()
\ No newline at end of file
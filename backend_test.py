@@ -1,10 +1,46 @@
-import requests
+import asyncio
+import contextvars
+import httpx
+import orjson
 import sys
-import json
-import io
-from datetime import datetime
+from functools import partial
+
+try:
+    import uvloop
+except ImportError:  # optional, tester-only (pip install uvloop); not available on Windows
+    uvloop = None
+
+# Bound how long a stalled server can hold up a test
+DEFAULT_TIMEOUT = httpx.Timeout(30.0, connect=5.0)  # connect 5s; read/write/pool 30s
+
+# Stateless GET tests: (name, method, endpoint, expected_status, list summary args for _log_list_summary)
+READ_TESTS = (
+    ("Root API Endpoint", "GET", "", 200, None),
+    ("Get All Videos", "GET", "videos", 200, ("videos", "Sample video", "filename")),
+    ("Get All Metadata", "GET", "metadata", 200, ("metadata entries", "Sample metadata", "title")),
+    ("Get Unused Metadata", "GET", "metadata/unused", 200, ("unused metadata entries",)),
+    ("Get Upload Queue", "GET", "queue", 200, ("queue items", "Sample queue item status", "status")),
+    ("Get Pending Uploads", "GET", "queue/pending", 200, ("pending uploads",)),
+    ("Get First Video Page", "GET", "videos?skip=0&limit=1", 200, ("videos on first page", "Sample video", "filename")),
+    ("Reject Invalid Page Size", "GET", "videos?limit=0", 422, None),
+)
+
+# Lines logged by the test running in the current task, flushed as one block when it finishes
+_current_test_log = contextvars.ContextVar('_current_test_log', default=None)
+
+# Payload for the upload test, built once and sent as raw bytes
+DUMMY_VIDEO_CONTENT = b"dummy video content for testing"
 
 class YouTubeShortsAPITester:
+    __slots__ = ('base_url', 'api_url', 'tests_run', 'tests_passed',
+                 'created_video_id', 'created_metadata_id', 'created_queue_id',
+                 'created_config_id', 'client', '_log_buf',
+                 'video_id_fut', 'metadata_id_fut', 'queue_id_fut',
+                 'config_id_fut', 'bulk_metadata_fut', 'config_read_fut')
+
+    _JSON_HEADERS = {'Content-Type': 'application/json'}
+    _EMPTY_HEADERS = {}
+
     def __init__(self, base_url="https://auto-yt-creator-1.preview.emergentagent.com"):
         self.base_url = base_url
         self.api_url = f"{base_url}/api"
@@ -14,65 +50,114 @@ class YouTubeShortsAPITester:
         self.created_metadata_id = None
         self.created_queue_id = None
         self.created_config_id = None
+        self.client = None
+        self._log_buf = []
+        # Resolved by the tests that create these IDs; created once the event loop is running
+        self.video_id_fut = None
+        self.metadata_id_fut = None
+        self.queue_id_fut = None
+        self.config_id_fut = None
+        self.bulk_metadata_fut = None
+        self.config_read_fut = None
+
+    async def __aenter__(self):
+        loop = asyncio.get_running_loop()
+        self.video_id_fut = loop.create_future()
+        self.metadata_id_fut = loop.create_future()
+        self.queue_id_fut = loop.create_future()
+        self.config_id_fut = loop.create_future()
+        self.bulk_metadata_fut = loop.create_future()
+        self.config_read_fut = loop.create_future()
+        # One HTTP/2 client shared by all tests, so concurrent requests reuse a single connection
+        self.client = httpx.AsyncClient(
+            base_url=f"{self.api_url}/",
+            http2=True,
+            timeout=DEFAULT_TIMEOUT,
+            headers={'Accept': 'application/json'},
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+        )
+        return self
 
-    def run_test(self, name, method, endpoint, expected_status, data=None, files=None):
-        """Run a single API test"""
-        url = f"{self.api_url}/{endpoint}"
-        headers = {}
-        if data and not files:
-            headers['Content-Type'] = 'application/json'
+    async def __aexit__(self, *exc_info):
+        await self.client.aclose()
+
+    async def warm_up(self):
+        """Open the pooled connection (DNS, TCP, TLS, HTTP/2 settings) before any test is timed"""
+        try:
+            await asyncio.gather(self.client.head(""), self.client.head(""))
+        except httpx.HTTPError as e:
+            self._log(f"⚠️  Connection warm-up failed: {str(e)}")
+
+    def _log(self, message):
+        # Collected and written in one go at the end of the run; lines from a running test
+        # are held back until it finishes so concurrent tests don't interleave
+        lines = _current_test_log.get()
+        (lines if lines is not None else self._log_buf).append(message)
+
+    def _log_list_summary(self, response, noun, sample_label=None, sample_field=None):
+        """Log the item count and the first item of a list response without walking the list"""
+        if not isinstance(response, list):
+            return
+        self._log(f"   Found {len(response)} {noun}")
+        first = next(iter(response), None)
+        if sample_label and first is not None:
+            self._log(f"   {sample_label}: {first.get(sample_field, 'N/A')}")
+
+    @staticmethod
+    def _is_json(response):
+        return 'application/json' in response.headers.get('content-type', '') and bool(response.content)
+
+    async def run_test(self, name, method, endpoint, expected_status, data=None, files=None, expected_content=None):
+        """Run a single API test, optionally checking the raw response body"""
+        headers = self._JSON_HEADERS if (data is not None and not files) else self._EMPTY_HEADERS
 
         self.tests_run += 1
-        print(f"\n🔍 Testing {name}...")
-        print(f"   URL: {url}")
+        self._log(f"\n🔍 Testing {name}...")
+        self._log(f"   Endpoint: /{endpoint}")
         
         try:
-            if method == 'GET':
-                response = requests.get(url, headers=headers)
-            elif method == 'POST':
-                if files:
-                    response = requests.post(url, files=files, data=data)
-                else:
-                    response = requests.post(url, json=data, headers=headers)
-            elif method == 'PUT':
-                response = requests.put(url, json=data, headers=headers)
+            if files:
+                response = await self.client.request(method, endpoint, files=files, data=data)
+            else:
+                content = orjson.dumps(data) if data is not None else None
+                response = await self.client.request(method, endpoint, content=content, headers=headers)
 
             success = response.status_code == expected_status
+            if success and expected_content is not None and response.content != expected_content:
+                self._log(f"❌ Failed - Body does not match expected content ({len(response.content)} bytes)")
+                return False, {}
             if success:
+                # Parse before counting the pass so a malformed JSON body fails the test
+                response_data = orjson.loads(response.content) if self._is_json(response) else None
                 self.tests_passed += 1
-                print(f"✅ Passed - Status: {response.status_code}")
-                try:
-                    response_data = response.json()
-                    print(f"   Response: {json.dumps(response_data, indent=2)[:200]}...")
-                    return True, response_data
-                except:
+                self._log(f"✅ Passed - Status: {response.status_code}")
+                if response_data is None:
                     return True, {}
+                # Preview the raw body rather than re-serializing the parsed response
+                self._log(f"   Response: {response.content[:200].decode('utf-8', 'replace')}...")
+                return True, response_data
             else:
-                print(f"❌ Failed - Expected {expected_status}, got {response.status_code}")
-                try:
-                    error_data = response.json()
-                    print(f"   Error: {error_data}")
-                except:
-                    print(f"   Error: {response.text}")
+                self._log(f"❌ Failed - Expected {expected_status}, got {response.status_code}")
+                if self._is_json(response):
+                    self._log(f"   Error: {orjson.loads(response.content)}")
+                else:
+                    self._log(f"   Error: {response.text}")
                 return False, {}
 
         except Exception as e:
-            print(f"❌ Failed - Error: {str(e)}")
+            self._log(f"❌ Failed - Error: {str(e)}")
             return False, {}
 
-    def test_root_endpoint(self):
-        """Test root API endpoint"""
-        success, response = self.run_test(
-            "Root API Endpoint",
-            "GET",
-            "",
-            200
-        )
+    async def run_read_test(self, name, method, endpoint, expected_status, summary=None):
+        """Run one READ_TESTS entry"""
+        success, response = await self.run_test(name, method, endpoint, expected_status)
+        if success and summary:
+            self._log_list_summary(response, *summary)
         return success
 
-    def test_dashboard_stats(self):
+    async def test_dashboard_stats(self):
         """Test dashboard stats endpoint"""
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "Dashboard Stats",
             "GET",
             "dashboard/stats",
@@ -82,20 +167,18 @@ class YouTubeShortsAPITester:
             required_fields = ['total_videos', 'completed', 'pending', 'unused_metadata']
             for field in required_fields:
                 if field not in response:
-                    print(f"❌ Missing field: {field}")
+                    self._log(f"❌ Missing field: {field}")
                     return False
-            print(f"   Stats: Videos={response.get('total_videos')}, Completed={response.get('completed')}, Pending={response.get('pending')}, Unused Metadata={response.get('unused_metadata')}")
+            self._log(f"   Stats: Videos={response.get('total_videos')}, Completed={response.get('completed')}, Pending={response.get('pending')}, Unused Metadata={response.get('unused_metadata')}")
         return success
 
-    def test_video_upload(self):
+    async def test_video_upload(self):
         """Test video upload with a dummy file"""
-        # Create a small dummy video file
-        dummy_video_content = b"dummy video content for testing"
         files = {
-            'file': ('test_video.mp4', io.BytesIO(dummy_video_content), 'video/mp4')
+            'file': ('test_video.mp4', DUMMY_VIDEO_CONTENT, 'video/mp4')
         }
         
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "Video Upload",
             "POST",
             "videos/upload",
@@ -105,27 +188,29 @@ class YouTubeShortsAPITester:
         
         if success and 'video_id' in response:
             self.created_video_id = response['video_id']
-            print(f"   Created video ID: {self.created_video_id}")
+            self._log(f"   Created video ID: {self.created_video_id}")
+        self.video_id_fut.set_result(self.created_video_id)
         
         return success
 
-    def test_get_videos(self):
-        """Test getting all videos"""
-        success, response = self.run_test(
-            "Get All Videos",
+    async def test_get_video_file(self):
+        """Test downloading the uploaded video file"""
+        await self.video_id_fut
+        if not self.created_video_id:
+            self._log("❌ Skipping video file test - missing video ID")
+            return False
+        
+        success, response = await self.run_test(
+            "Get Video File",
             "GET",
-            "videos",
-            200
+            f"videos/{self.created_video_id}/file",
+            200,
+            expected_content=DUMMY_VIDEO_CONTENT
         )
         
-        if success and isinstance(response, list):
-            print(f"   Found {len(response)} videos")
-            if len(response) > 0:
-                print(f"   Sample video: {response[0].get('filename', 'N/A')}")
-        
         return success
 
-    def test_create_metadata(self):
+    async def test_create_metadata(self):
         """Test creating single metadata"""
         metadata_data = {
             "title": "Test Video Title",
@@ -133,7 +218,7 @@ class YouTubeShortsAPITester:
             "hashtags": ["test", "automation", "shorts", "youtube"]
         }
         
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "Create Single Metadata",
             "POST",
             "metadata",
@@ -143,11 +228,12 @@ class YouTubeShortsAPITester:
         
         if success and 'id' in response:
             self.created_metadata_id = response['id']
-            print(f"   Created metadata ID: {self.created_metadata_id}")
+            self._log(f"   Created metadata ID: {self.created_metadata_id}")
+        self.metadata_id_fut.set_result(self.created_metadata_id)
         
         return success
 
-    def test_bulk_create_metadata(self):
+    async def test_bulk_create_metadata(self):
         """Test bulk metadata creation"""
         bulk_metadata = [
             {
@@ -162,50 +248,22 @@ class YouTubeShortsAPITester:
             }
         ]
         
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "Bulk Create Metadata",
             "POST",
             "metadata/bulk",
             200,
             data=bulk_metadata
         )
+        self.bulk_metadata_fut.set_result(success)
         
         return success
 
-    def test_get_metadata(self):
-        """Test getting all metadata"""
-        success, response = self.run_test(
-            "Get All Metadata",
-            "GET",
-            "metadata",
-            200
-        )
-        
-        if success and isinstance(response, list):
-            print(f"   Found {len(response)} metadata entries")
-            if len(response) > 0:
-                print(f"   Sample metadata: {response[0].get('title', 'N/A')}")
-        
-        return success
-
-    def test_get_unused_metadata(self):
-        """Test getting unused metadata"""
-        success, response = self.run_test(
-            "Get Unused Metadata",
-            "GET",
-            "metadata/unused",
-            200
-        )
-        
-        if success and isinstance(response, list):
-            print(f"   Found {len(response)} unused metadata entries")
-        
-        return success
-
-    def test_create_upload_queue(self):
+    async def test_create_upload_queue(self):
         """Test creating upload queue item"""
+        await asyncio.gather(self.video_id_fut, self.metadata_id_fut)
         if not self.created_video_id or not self.created_metadata_id:
-            print("❌ Skipping queue test - missing video or metadata ID")
+            self._log("❌ Skipping queue test - missing video or metadata ID")
             return False
             
         queue_data = {
@@ -214,7 +272,7 @@ class YouTubeShortsAPITester:
             "schedule_interval": "immediately"
         }
         
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "Create Upload Queue",
             "POST",
             "queue",
@@ -224,49 +282,45 @@ class YouTubeShortsAPITester:
         
         if success and 'id' in response:
             self.created_queue_id = response['id']
-            print(f"   Created queue ID: {self.created_queue_id}")
+            self._log(f"   Created queue ID: {self.created_queue_id}")
+        self.queue_id_fut.set_result(self.created_queue_id)
         
         return success
 
-    def test_get_upload_queue(self):
-        """Test getting upload queue"""
-        success, response = self.run_test(
-            "Get Upload Queue",
-            "GET",
-            "queue",
-            200
-        )
+    async def test_reuse_claimed_metadata(self):
+        """Test that metadata already queued can't be queued again"""
+        await self.queue_id_fut
+        if not self.created_queue_id:
+            self._log("❌ Skipping claimed metadata test - missing queue ID")
+            return False
         
-        if success and isinstance(response, list):
-            print(f"   Found {len(response)} queue items")
-            if len(response) > 0:
-                print(f"   Sample queue item status: {response[0].get('status', 'N/A')}")
+        queue_data = {
+            "video_id": self.created_video_id,
+            "metadata_id": self.created_metadata_id,
+            "schedule_interval": "immediately"
+        }
         
-        return success
-
-    def test_get_pending_uploads(self):
-        """Test getting pending uploads"""
-        success, response = self.run_test(
-            "Get Pending Uploads",
-            "GET",
-            "queue/pending",
-            200
+        success, response = await self.run_test(
+            "Reject Already-Used Metadata",
+            "POST",
+            "queue",
+            409,
+            data=queue_data
         )
         
-        if success and isinstance(response, list):
-            print(f"   Found {len(response)} pending uploads")
-        
         return success
 
-    def test_sequential_scheduling(self):
+    async def test_sequential_scheduling(self):
         """Test sequential scheduling feature"""
+        # Runs after the single queue test so it doesn't claim that test's metadata first
+        await asyncio.gather(self.queue_id_fut, self.bulk_metadata_fut)
         sequential_data = {
             "schedule_interval": "immediately",
             "start_sequence": 1,
             "count": 2
         }
         
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "Sequential Scheduling",
             "POST",
             "queue/sequential",
@@ -275,13 +329,13 @@ class YouTubeShortsAPITester:
         )
         
         if success:
-            print(f"   Scheduled count: {response.get('scheduled_count', 'N/A')}")
-            print(f"   Start sequence: {response.get('start_sequence', 'N/A')}")
-            print(f"   Schedule interval: {response.get('schedule_interval', 'N/A')}")
+            self._log(f"   Scheduled count: {response.get('scheduled_count', 'N/A')}")
+            self._log(f"   Start sequence: {response.get('start_sequence', 'N/A')}")
+            self._log(f"   Schedule interval: {response.get('schedule_interval', 'N/A')}")
         
         return success
 
-    def test_create_api_config(self):
+    async def test_create_api_config(self):
         """Test creating API configuration"""
         config_data = {
             "youtube_api_key": "test_api_key_12345",
@@ -291,7 +345,7 @@ class YouTubeShortsAPITester:
             "default_privacy": "private"
         }
         
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "Create API Configuration",
             "POST",
             "config/api",
@@ -301,13 +355,15 @@ class YouTubeShortsAPITester:
         
         if success and 'id' in response:
             self.created_config_id = response['id']
-            print(f"   Created config ID: {self.created_config_id}")
+            self._log(f"   Created config ID: {self.created_config_id}")
+        self.config_id_fut.set_result(self.created_config_id)
         
         return success
 
-    def test_get_api_config(self):
+    async def test_get_api_config(self):
         """Test getting active API configuration"""
-        success, response = self.run_test(
+        await self.config_id_fut
+        success, response = await self.run_test(
             "Get Active API Configuration",
             "GET",
             "config/api",
@@ -315,16 +371,19 @@ class YouTubeShortsAPITester:
         )
         
         if success:
-            print(f"   Config ID: {response.get('id', 'N/A')}")
-            print(f"   Is Active: {response.get('is_active', 'N/A')}")
-            print(f"   Default Privacy: {response.get('default_privacy', 'N/A')}")
+            self._log(f"   Config ID: {response.get('id', 'N/A')}")
+            self._log(f"   Is Active: {response.get('is_active', 'N/A')}")
+            self._log(f"   Default Privacy: {response.get('default_privacy', 'N/A')}")
+        self.config_read_fut.set_result(success)
         
         return success
 
-    def test_update_api_config(self):
+    async def test_update_api_config(self):
         """Test updating API configuration"""
+        # The update briefly deactivates every config, so let the active-config read finish first
+        await asyncio.gather(self.config_id_fut, self.config_read_fut)
         if not hasattr(self, 'created_config_id') or not self.created_config_id:
-            print("❌ Skipping config update test - missing config ID")
+            self._log("❌ Skipping config update test - missing config ID")
             return False
             
         update_data = {
@@ -335,7 +394,7 @@ class YouTubeShortsAPITester:
             "default_privacy": "public"
         }
         
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "Update API Configuration",
             "PUT",
             f"config/api/{self.created_config_id}",
@@ -345,37 +404,53 @@ class YouTubeShortsAPITester:
         
         return success
 
+async def run_safely(tester, test, publishes=None):
+    # Each test runs in its own task, so this only affects the current test's context
+    lines = []
+    _current_test_log.set(lines)
+    try:
+        return await test()
+    except Exception as e:
+        tester._log(f"❌ Test failed with exception: {str(e)}")
+        return False
+    finally:
+        tester._log_buf.extend(lines)
+        # Never leave dependent tests waiting on a test that failed before publishing
+        if publishes is not None and not publishes.done():
+            publishes.set_result(None)
+
+async def run_all_tests(tester):
+    # Each test paired with the future it publishes for dependent tests, if any.
+    # Dependent tests await those futures themselves, so everything is started at once.
+    tests = [(partial(tester.run_read_test, *test), None) for test in READ_TESTS]
+    tests += [
+        (tester.test_dashboard_stats, None),
+        (tester.test_video_upload, tester.video_id_fut),
+        (tester.test_get_video_file, None),
+        (tester.test_create_metadata, tester.metadata_id_fut),
+        (tester.test_bulk_create_metadata, tester.bulk_metadata_fut),
+        (tester.test_create_upload_queue, tester.queue_id_fut),
+        (tester.test_reuse_claimed_metadata, None),
+        (tester.test_sequential_scheduling, None),
+        (tester.test_create_api_config, tester.config_id_fut),
+        (tester.test_get_api_config, tester.config_read_fut),
+        (tester.test_update_api_config, None)
+    ]
+    await asyncio.gather(*(run_safely(tester, test, publishes) for test, publishes in tests))
+
+async def _main():
+    async with YouTubeShortsAPITester() as tester:
+        await tester.warm_up()
+        await run_all_tests(tester)
+    return tester
+
 def main():
     print("🚀 Starting YouTube Shorts Automation Server API Tests")
     print("=" * 60)
     
-    tester = YouTubeShortsAPITester()
-    
-    # Test sequence
-    tests = [
-        tester.test_root_endpoint,
-        tester.test_dashboard_stats,
-        tester.test_video_upload,
-        tester.test_get_videos,
-        tester.test_create_metadata,
-        tester.test_bulk_create_metadata,
-        tester.test_get_metadata,
-        tester.test_get_unused_metadata,
-        tester.test_create_upload_queue,
-        tester.test_get_upload_queue,
-        tester.test_get_pending_uploads,
-        tester.test_sequential_scheduling,
-        tester.test_create_api_config,
-        tester.test_get_api_config,
-        tester.test_update_api_config
-    ]
-    
-    # Run all tests
-    for test in tests:
-        try:
-            test()
-        except Exception as e:
-            print(f"❌ Test failed with exception: {str(e)}")
+    # Prefer uvloop's libuv-based event loop when it is installed
+    tester = uvloop.run(_main()) if uvloop else asyncio.run(_main())
+    sys.stdout.write('\n'.join(tester._log_buf) + '\n')
     
     # Print final results
     print("\n" + "=" * 60)